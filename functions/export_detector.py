@@ -0,0 +1,58 @@
+"""
+Export the AI detector to ONNX Runtime for CPU inference
+Run once before deploying: python export_detector.py
+"""
+
+import os
+import torch
+from onnxruntime.quantization import quantize_dynamic, QuantType
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from models.detector import MODEL_NAME, MODEL_REVISION, ONNX_PATH
+
+
+def export_detector():
+    """Export the detector to FP32 ONNX, then quantize the weights to INT8"""
+    fp32_path = os.path.splitext(ONNX_PATH)[0] + '.fp32.onnx'
+    assert fp32_path != ONNX_PATH, "FP32 export path must differ from the INT8 output"
+    
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, revision=MODEL_REVISION)
+    model = AutoModelForSequenceClassification.from_pretrained(
+        MODEL_NAME,
+        revision=MODEL_REVISION,
+        num_labels=2
+    )
+    model.config.return_dict = False
+    model.eval()
+    
+    dummy = tokenizer(
+        "warmup " * 512,
+        return_tensors="pt",
+        truncation=True,
+        max_length=512
+    )
+    
+    print(f"Exporting {MODEL_NAME} to {fp32_path}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (dummy['input_ids'], dummy['attention_mask']),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"}
+            },
+            opset_version=17,
+            dynamo=False
+        )
+    
+    print(f"Quantizing to {ONNX_PATH}...")
+    quantize_dynamic(fp32_path, ONNX_PATH, weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    print("Export complete!")
+
+
+if __name__ == "__main__":
+    export_detector()
@@ -3,29 +3,146 @@ Firebase Cloud Functions for AI Text Analysis
 Deploy with: firebase deploy --only functions
 """
 
-from firebase_functions import https_fn
+from firebase_functions import https_fn, options
 from firebase_admin import initialize_app, firestore
-import json
-from models.detector import AIDetector
-from models.summarizer import TextSummarizer
-from models.generator import TextGenerator
+from functools import wraps
+import logging
+import os
+import signal
+import threading
+import orjson
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Constant error bodies, serialized once at load
+_ERR_METHOD_NOT_ALLOWED = orjson.dumps({"error": "Method not allowed"})
+_ERR_NO_TEXT = orjson.dumps({"error": "No text provided"})
+_ERR_TEXT_TOO_SHORT = orjson.dumps({"error": "Text must be at least 50 characters"})
+_ERR_NO_PROMPT = orjson.dumps({"error": "No prompt provided"})
+_ERR_TOO_LARGE = orjson.dumps({"error": "Request body too large"})
+_ERR_INVALID_JSON = orjson.dumps({"error": "Request body must be a JSON object"})
+
+# Largest request body accepted by any endpoint
+MAX_BODY_BYTES = 1024 * 1024
 
 # Initialize Firebase Admin SDK
 initialize_app()
-db = firestore.client()
 
-# Initialize AI models (loaded once per cold start)
-print("Loading AI models...")
-detector = AIDetector()
-summarizer = TextSummarizer()
-generator = TextGenerator()
-print("Models loaded successfully!")
 
+def _lazy(factory):
+    """
+    Build factory() once per process on first call
+    Concurrent first calls (a cold-start burst) wait on a lock instead of each building a copy
+    """
+    lock = threading.Lock()
+    instance = []
+    
+    @wraps(factory)
+    def get():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+    
+    get.loaded = lambda: bool(instance)
+    return get
+
+
+@_lazy
+def get_result_writer():
+    """Start the background result writer on first use (it creates the Firestore client itself)"""
+    from result_writer import ResultWriter
+    return ResultWriter(firestore.client)
 
-@https_fn.on_request(cors=https_fn.CorsOptions(
-    cors_origins=["*"],
-    cors_methods=["POST", "OPTIONS"]
-))
+
+def save_result(doc):
+    """Queue a result for Firestore; a storage failure never costs the caller their response"""
+    try:
+        get_result_writer().add(doc)
+    except Exception as db_error:
+        logger.error("Firestore error, dropped 1 result: %s", db_error)
+
+
+def _flush_results_on_sigterm(signum, frame):
+    """Commit queued results before the instance is shut down, then run the previous handler"""
+    if get_result_writer.loaded():
+        get_result_writer().close()
+    
+    if callable(_previous_sigterm):
+        _previous_sigterm(signum, frame)
+    else:
+        raise SystemExit(128 + signum)
+
+
+# Signal handlers can only be installed from the main thread
+if threading.current_thread() is threading.main_thread():
+    _previous_sigterm = signal.signal(signal.SIGTERM, _flush_results_on_sigterm)
+
+
+def parse_json_body(req):
+    """
+    Parse the JSON request body, rejecting anything over MAX_BODY_BYTES
+    Returns (data, None) on success, or (None, error response)
+    """
+    if req.content_length is not None and req.content_length > MAX_BODY_BYTES:
+        return None, https_fn.Response(_ERR_TOO_LARGE, status=413, mimetype='application/json')
+    
+    # Read at most one byte past the limit, so bodies without Content-Length stay bounded
+    body = req.stream.read(MAX_BODY_BYTES + 1)
+    if len(body) > MAX_BODY_BYTES:
+        return None, https_fn.Response(_ERR_TOO_LARGE, status=413, mimetype='application/json')
+    
+    try:
+        data = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        data = None
+    
+    if not isinstance(data, dict):
+        return None, https_fn.Response(_ERR_INVALID_JSON, status=400, mimetype='application/json')
+    
+    return data, None
+
+
+# AI models are loaded lazily, so a cold start only pays for the model its endpoint uses
+@_lazy
+def get_detector():
+    """Load the AI detector on first use"""
+    from models.detector import AIDetector
+    return AIDetector()
+
+
+@_lazy
+def get_detection_batcher():
+    """Batch concurrent detection requests into a single detector forward pass"""
+    from models.batcher import DynamicBatcher
+    from models.detector import MAX_BATCH_SIZE
+    return DynamicBatcher(get_detector().predict, max_batch_size=MAX_BATCH_SIZE, max_wait=0.01)
+
+
+@_lazy
+def get_summarizer():
+    """Load the summarizer on first use"""
+    from models.summarizer import TextSummarizer
+    return TextSummarizer()
+
+
+@_lazy
+def get_generator():
+    """Load the text generator on first use"""
+    from models.generator import TextGenerator
+    return TextGenerator()
+
+
+@https_fn.on_request(
+    memory=options.MemoryOption.GB_2,
+    cpu=2,
+    cors=https_fn.CorsOptions(
+        cors_origins=["*"],
+        cors_methods=["POST", "OPTIONS"]
+    )
+)
 def detectAIText(req: https_fn.Request) -> https_fn.Response:
     """
     Detect if text is AI-generated
@@ -48,66 +165,70 @@ def detectAIText(req: https_fn.Request) -> https_fn.Response:
     
     if req.method != 'POST':
         return https_fn.Response(
-            json.dumps({"error": "Method not allowed"}),
+            _ERR_METHOD_NOT_ALLOWED,
             status=405,
             mimetype='application/json'
         )
     
     try:
-        # Parse request
-        data = req.get_json()
+        # Parse request (validated before any model is loaded)
+        data, error = parse_json_body(req)
+        if error is not None:
+            return error
+        
         text = data.get('text', '').strip()
         
         # Validation
         if not text:
             return https_fn.Response(
-                json.dumps({"error": "No text provided"}),
+                _ERR_NO_TEXT,
                 status=400,
                 mimetype='application/json'
             )
         
         if len(text) < 50:
             return https_fn.Response(
-                json.dumps({"error": "Text must be at least 50 characters"}),
+                _ERR_TEXT_TOO_SHORT,
                 status=400,
                 mimetype='application/json'
             )
         
         # Run AI detection
-        print(f"Processing detection for {len(text)} characters")
-        result = detector.predict(text)
+        logger.info("Processing detection for %d characters", len(text))
+        result = get_detection_batcher().submit(text)
         
-        # Save to Firestore
-        try:
-            db.collection('results').add({
-                'type': 'detection',
-                'input': text[:500],
-                'output': result,
-                'timestamp': firestore.SERVER_TIMESTAMP
-            })
-        except Exception as db_error:
-            print(f"Firestore error: {db_error}")
+        # Save to Firestore (written in the background)
+        save_result({
+            'type': 'detection',
+            'input': text[:500],
+            'output': result,
+            'timestamp': firestore.SERVER_TIMESTAMP
+        })
         
         # Return result
         return https_fn.Response(
-            json.dumps(result),
+            orjson.dumps(result),
             status=200,
             mimetype='application/json'
         )
         
     except Exception as e:
-        print(f"Error in detectAIText: {str(e)}")
+        logger.error("Error in detectAIText: %s", e)
         return https_fn.Response(
-            json.dumps({"error": f"Internal server error: {str(e)}"}),
+            orjson.dumps({"error": f"Internal server error: {str(e)}"}),
             status=500,
             mimetype='application/json'
         )
 
 
-@https_fn.on_request(cors=https_fn.CorsOptions(
-    cors_origins=["*"],
-    cors_methods=["POST", "OPTIONS"]
-))
+@https_fn.on_request(
+    memory=options.MemoryOption.GB_2,
+    cpu=2,
+    cors=https_fn.CorsOptions(
+        cors_origins=["*"],
+        cors_methods=["POST", "OPTIONS"]
+    )
+)
 def summarizeText(req: https_fn.Request) -> https_fn.Response:
     """
     Summarize text
@@ -132,58 +253,63 @@ def summarizeText(req: https_fn.Request) -> https_fn.Response:
     
     if req.method != 'POST':
         return https_fn.Response(
-            json.dumps({"error": "Method not allowed"}),
+            _ERR_METHOD_NOT_ALLOWED,
             status=405,
             mimetype='application/json'
         )
     
     try:
-        data = req.get_json()
+        data, error = parse_json_body(req)
+        if error is not None:
+            return error
+        
         text = data.get('text', '').strip()
         ratio = float(data.get('ratio', 0.5))
         format_type = data.get('format', 'paragraph')
         
         if not text:
             return https_fn.Response(
-                json.dumps({"error": "No text provided"}),
+                _ERR_NO_TEXT,
                 status=400,
                 mimetype='application/json'
             )
         
         # Run summarization
-        print(f"Processing summarization with ratio {ratio}")
-        result = summarizer.summarize(text, ratio, format_type)
+        logger.info("Processing summarization with ratio %s", ratio)
+        result = get_summarizer().summarize(text, ratio, format_type)
         
-        # Save to Firestore
-        try:
-            db.collection('results').add({
-                'type': 'summary',
-                'input': text[:500],
-                'output': result,
-                'timestamp': firestore.SERVER_TIMESTAMP
-            })
-        except Exception as db_error:
-            print(f"Firestore error: {db_error}")
+        # Save to Firestore (written in the background)
+        save_result({
+            'type': 'summary',
+            'input': text[:500],
+            'output': result,
+            'timestamp': firestore.SERVER_TIMESTAMP
+        })
         
         return https_fn.Response(
-            json.dumps(result),
+            orjson.dumps(result),
             status=200,
             mimetype='application/json'
         )
         
     except Exception as e:
-        print(f"Error in summarizeText: {str(e)}")
+        logger.error("Error in summarizeText: %s", e)
         return https_fn.Response(
-            json.dumps({"error": f"Internal server error: {str(e)}"}),
+            orjson.dumps({"error": f"Internal server error: {str(e)}"}),
             status=500,
             mimetype='application/json'
         )
 
 
-@https_fn.on_request(cors=https_fn.CorsOptions(
-    cors_origins=["*"],
-    cors_methods=["POST", "OPTIONS"]
-))
+@https_fn.on_request(
+    memory=options.MemoryOption.GB_2,
+    cpu=2,
+    min_instances=1,
+    cors=https_fn.CorsOptions(
+        cors_origins=["*"],
+        cors_methods=["POST", "OPTIONS"]
+    )
+)
 def generateText(req: https_fn.Request) -> https_fn.Response:
     """
     Generate text from prompt
@@ -208,13 +334,16 @@ def generateText(req: https_fn.Request) -> https_fn.Response:
     
     if req.method != 'POST':
         return https_fn.Response(
-            json.dumps({"error": "Method not allowed"}),
+            _ERR_METHOD_NOT_ALLOWED,
             status=405,
             mimetype='application/json'
         )
     
     try:
-        data = req.get_json()
+        data, error = parse_json_body(req)
+        if error is not None:
+            return error
+        
         prompt = data.get('prompt', '').strip()
         tone = data.get('tone', 'formal')
         max_length = int(data.get('maxLength', 500))
@@ -222,36 +351,39 @@ def generateText(req: https_fn.Request) -> https_fn.Response:
         
         if not prompt:
             return https_fn.Response(
-                json.dumps({"error": "No prompt provided"}),
+                _ERR_NO_PROMPT,
                 status=400,
                 mimetype='application/json'
             )
         
         # Run text generation
-        print(f"Generating text with prompt: {prompt[:50]}...")
-        result = generator.generate(prompt, tone, max_length, temperature)
+        logger.info("Generating text with prompt: %.50s...", prompt)
+        result = get_generator().generate(prompt, tone, max_length, temperature)
         
-        # Save to Firestore
-        try:
-            db.collection('results').add({
-                'type': 'generation',
-                'input': prompt,
-                'output': result,
-                'timestamp': firestore.SERVER_TIMESTAMP
-            })
-        except Exception as db_error:
-            print(f"Firestore error: {db_error}")
+        # Save to Firestore (written in the background)
+        save_result({
+            'type': 'generation',
+            'input': prompt,
+            'output': result,
+            'timestamp': firestore.SERVER_TIMESTAMP
+        })
         
         return https_fn.Response(
-            json.dumps(result),
+            orjson.dumps(result),
             status=200,
             mimetype='application/json'
         )
         
     except Exception as e:
-        print(f"Error in generateText: {str(e)}")
+        logger.error("Error in generateText: %s", e)
         return https_fn.Response(
-            json.dumps({"error": f"Internal server error: {str(e)}"}),
+            orjson.dumps({"error": f"Internal server error: {str(e)}"}),
             status=500,
             mimetype='application/json'
-        )
\ No newline at end of file
+        )
+
+
+# generateText keeps a warm instance (min_instances=1), so load its model when the
+# instance starts rather than on the first request it serves
+if os.environ.get('FUNCTION_TARGET') == 'generateText':
+    get_generator()
@@ -0,0 +1,65 @@
+"""
+Dynamic batching for model inference
+Collects concurrent requests for a few milliseconds and runs them as a single batch
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class DynamicBatcher:
+    def __init__(self, batch_fn, max_batch_size=8, max_wait=0.01):
+        """
+        Start the background batching worker
+        
+        Args:
+            batch_fn: Function taking a list of items and returning a list of results
+            max_batch_size: Maximum number of items per batch
+            max_wait: Seconds to wait for more items after the first one arrives
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.pending = queue.Queue()
+        
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+    
+    def submit(self, item):
+        """Queue an item and block until the result of its batch is available"""
+        future = Future()
+        self.pending.put((item, future))
+        return future.result()
+    
+    def collect(self):
+        """Wait for the first item, then gather more until the batch is full or max_wait passes"""
+        batch = [self.pending.get()]
+        deadline = time.monotonic() + self.max_wait
+        
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=timeout))
+            except queue.Empty:
+                break
+        
+        return batch
+    
+    def run(self):
+        """Worker loop: run each collected batch and route results back to the callers"""
+        while True:
+            batch = self.collect()
+            
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
@@ -0,0 +1,26 @@
+"""
+CPU runtime settings shared by the models
+Applied once per process, before any model runs
+"""
+
+import os
+import torch
+
+
+# vCPUs allocated to the function (cpu=2 in main.py); PyTorch otherwise sizes its
+# thread pools from the host core count and oversubscribes the instance
+NUM_THREADS = int(os.environ.get('FUNCTION_CPU', '2'))
+
+_configured = False
+
+
+def configure_cpu_threads():
+    """Pin PyTorch CPU thread pools to the allocated vCPUs and enable oneDNN"""
+    global _configured
+    if _configured or torch.cuda.is_available():
+        return
+    
+    torch.set_num_threads(NUM_THREADS)
+    torch.set_num_interop_threads(1)  # May only be set once per process
+    torch.backends.mkldnn.enabled = True
+    _configured = True
@@ -0,0 +1,107 @@
+"""
+Background Firestore writer
+Queues result documents and commits them in batches off the request path
+
+Caveat: Cloud Functions (gen2) only guarantees CPU while a request is being handled,
+so commits queued after the last response of a burst may be delayed until the next
+request or until shutdown. close() drains the queue on exit (atexit / SIGTERM), and
+documents that still cannot be written are logged as dropped.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+# Queued by close() to wake the worker when it is waiting for documents
+_STOP = object()
+
+
+class ResultWriter:
+    def __init__(self, get_db, collection='results', interval=0.1, max_batch_size=500):
+        """
+        Start the background writer
+        
+        Args:
+            get_db: Returns the Firestore client; called on the first commit, off the request path
+            collection: Collection the documents are added to
+            interval: Seconds to collect documents before each batch commit
+            max_batch_size: Maximum documents per commit (Firestore allows 500)
+        """
+        self.get_db = get_db
+        self.db = None
+        self.collection = collection
+        self.interval = interval
+        self.max_batch_size = max_batch_size
+        self.pending = queue.Queue()
+        self.stopping = threading.Event()
+        
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+        atexit.register(self.close)
+    
+    def add(self, doc):
+        """Queue a document to be written; returns immediately"""
+        if self.stopping.is_set():
+            # The worker is shutting down, so write this one directly
+            self.commit([doc])
+            return
+        
+        self.pending.put(doc)
+    
+    def collect(self):
+        """Wait for the first document, then gather everything queued within the interval"""
+        docs = []
+        first = self.pending.get()
+        if first is not _STOP:
+            docs.append(first)
+            self.stopping.wait(self.interval)  # Cut short when closing
+        
+        while len(docs) < self.max_batch_size:
+            try:
+                doc = self.pending.get_nowait()
+            except queue.Empty:
+                break
+            if doc is not _STOP:
+                docs.append(doc)
+        
+        return docs
+    
+    def commit(self, docs):
+        """Write documents in a single batch, logging them as dropped on failure"""
+        try:
+            if self.db is None:
+                self.db = self.get_db()
+            
+            batch = self.db.batch()
+            for doc in docs:
+                batch.set(self.db.collection(self.collection).document(), doc)
+            batch.commit()
+        except Exception as db_error:
+            logger.error("Firestore error, dropped %d results: %s", len(docs), db_error)
+    
+    def run(self):
+        """Worker loop: commit each collected group of documents as one batch"""
+        while not (self.stopping.is_set() and self.pending.empty()):
+            docs = self.collect()
+            if docs:
+                self.commit(docs)
+    
+    def close(self, timeout=5.0):
+        """Stop accepting queued documents and wait for everything pending to be committed"""
+        if self.stopping.is_set():
+            return
+        
+        self.stopping.set()
+        self.pending.put(_STOP)
+        self.worker.join(timeout)
+        
+        if self.worker.is_alive():
+            logger.error(
+                "Result writer did not finish within %.1fs, dropped about %d queued results",
+                timeout,
+                self.pending.qsize()
+            )